@@ -1,5 +1,7 @@
 from env import ROOT_PATH
-from mcp_server import mcp
 
 if __name__ == "__main__":
+    # 파이프라인의 작업 프로세스(forkserver/spawn)가 이 모듈을 다시 불러올 때
+    # 모델과 Chroma를 불러오지 않도록 서버 모듈은 실행 시에만 불러옵니다.
+    from mcp_server import mcp
     mcp.run(transport="sse", uvicorn_config={"root_path": ROOT_PATH})
@@ -1,20 +1,23 @@
 import asyncio
-import re
-import sys
-import json
-import base64
-import pandas as pd
+import multiprocessing
+import os
+import threading
+import sqlite3
+import numpy as np
+import torch
+from contextlib import closing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from concurrent.futures.process import BrokenProcessPool
 
 import chromadb
-from chromadb.utils import embedding_functions
-import markdownify
-import markdown
+from sentence_transformers import SentenceTransformer
 from datetime import datetime
 from fastmcp.utilities.logging import get_logger
 
-from env import MODEL_NAME, TEXT_PREFIX, QUERY_PREFIX
-from notebook_db import fetch_notes_from_db
-from link import get_link_preview
+from env import CHROMA_HOST, CHROMA_PORT, EMBEDDING_FP16, MODEL_NAME, QUERY_PREFIX, SEARCH_CACHE_SIZE, SEARCH_CACHE_THRESHOLD
+from notebook_db import fetch_notes_from_db, fetch_last_note_update_from_db
+from semantic_cache import SemanticCache
+from transform import process_content
 
 # ---------------------------------------------------------
 # 1. 설정 (Configuration)
@@ -23,285 +26,468 @@ from link import get_link_preview
 VECTOR_DB_PATH = "./chroma_db_store"
 COLLECTION_NAME = "note_collection"
 STATE_COLLECTION_NAME = "system_state"
+STATE_DB_PATH = "./system_state.db"
 
 logger = get_logger(__name__)
 
-client = chromadb.PersistentClient(path=VECTOR_DB_PATH)
-state_collection = client.get_or_create_collection(name=STATE_COLLECTION_NAME)
+DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+
+# CHROMA_HOST가 설정되면 별도로 실행한 Chroma 서버(chroma run)에 접속하고,
+# 없으면 로컬 디렉터리를 직접 여는 PersistentClient를 사용합니다.
+if CHROMA_HOST:
+    client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
+else:
+    client = chromadb.PersistentClient(path=VECTOR_DB_PATH)
+
+# 임베딩 모델과 컬렉션은 한 번만 생성하여 파이프라인 실행 간에 재사용합니다.
+# 임베딩은 Chroma 밖에서 큰 배치로 직접 계산하여 upsert에 전달합니다.
+model = SentenceTransformer(MODEL_NAME, device=DEVICE)
+# EMBEDDING_FP16이 켜져 있으면 GPU에서 FP16 가중치로 추론하여 메모리 대역폭을 줄입니다. (기본값: FP32)
+EMBEDDING_PRECISION = "fp16" if DEVICE == "cuda" and EMBEDDING_FP16 else "fp32"
+if EMBEDDING_PRECISION == "fp16":
+    torch.set_float32_matmul_precision("high")
+    model.half()
+encode_batch_size = 128
+query_batch_size = 64
+# 임베딩을 정규화하여 저장하므로 코사인 거리를 내적(ip)으로 계산합니다.
+# 저장된 임베딩의 정밀도도 함께 기록하여, 정밀도가 바뀌면 컬렉션을 다시 임베딩합니다.
+COLLECTION_METADATA = {"hnsw:space": "ip", "embedding_precision": EMBEDDING_PRECISION}
+
+def _open_note_collection():
+    # get_or_create_collection은 기존 컬렉션의 메타데이터를 덮어쓰므로, 기존 컬렉션은 그대로 열어
+    # migrate_note_collection이 저장 당시의 거리 공간과 정밀도를 비교할 수 있도록 합니다.
+    try:
+        return client.get_collection(name=COLLECTION_NAME, embedding_function=None)
+    except Exception:
+        return client.create_collection(name=COLLECTION_NAME, embedding_function=None, metadata=COLLECTION_METADATA)
+
+note_collection = _open_note_collection()
 
 # ---------------------------------------------------------
 # 1-1. 상태 관리 (State Management)
 # ---------------------------------------------------------
+# 상태값은 벡터 검색이 필요 없는 키-값 데이터이므로 Chroma 대신 SQLite 테이블에 저장합니다.
+def _connect_state_db():
+    return closing(sqlite3.connect(STATE_DB_PATH))
+
+# last_run_at/last_run_id는 (co_updated, co_id) 순서로 마지막으로 저장한 노트의 위치입니다.
+# last_run_id가 없으면 last_run_at 시각의 노트는 모두 처리된 것으로 봅니다.
+with _connect_state_db() as conn, conn:
+    conn.execute("CREATE TABLE IF NOT EXISTS system_state (id TEXT PRIMARY KEY, last_run_at TEXT, last_run_id INTEGER)")
+    if "last_run_id" not in {column[1] for column in conn.execute("PRAGMA table_info(system_state)")}:
+        conn.execute("ALTER TABLE system_state ADD COLUMN last_run_id INTEGER")
+
+def _get_legacy_last_run_time():
+    """
+    이전 버전에서 system_state 컬렉션에 저장한 마지막 실행 시간을 조회합니다.
+    """
+    try:
+        result = client.get_collection(name=STATE_COLLECTION_NAME).get(ids=["etl_status"])
+    except Exception:
+        return None
+    if result['ids']:
+        return result['metadatas'][0].get('last_run_at')
+    return None
+
 def get_last_run_time():
     """
-    system_state 컬렉션에서 마지막 실행 시간을 조회합니다.
+    system_state 테이블에서 마지막으로 저장한 노트의 (수정 시간, ID)를 조회합니다.
     """
     # ID가 'etl_status'인 데이터 조회
-    result = state_collection.get(ids=["etl_status"])
+    with _connect_state_db() as conn:
+        row = conn.execute("SELECT last_run_at, last_run_id FROM system_state WHERE id = ?", ("etl_status",)).fetchone()
     
-    # 데이터가 있으면 메타데이터에서 timestamp 반환
-    if result['ids']:
-        last_run = result['metadatas'][0].get('last_run_at')
-        return last_run
+    # 데이터가 있으면 timestamp 반환
+    if row:
+        return row[0], row[1]
+
+    # 이전 버전의 system_state 컬렉션에 기록이 있으면 이어서 사용
+    last_run = _get_legacy_last_run_time()
+    if last_run:
+        return last_run, None
     
     # 없으면 초기값 반환
     logger.info("[State] 실행 기록 없음. 초기화 모드로 동작.")
-    return '1970-01-01 00:00:00'
+    return '1970-01-01 00:00:00', None
 
-def update_last_run_time(last_timestamp):
+def update_last_run_time(last_timestamp, last_id=None):
     """
-    system_state 컬렉션에 마지막 실행 시간을 저장(덮어쓰기)합니다.
+    system_state 테이블에 마지막으로 저장한 노트의 (수정 시간, ID)를 저장(덮어쓰기)합니다.
     """
     # datetime 객체를 문자열로 변환
-    if isinstance(last_timestamp, (pd.Timestamp, datetime)):
+    if isinstance(last_timestamp, datetime):
         last_timestamp = str(last_timestamp)
 
-    # 더미 임베딩을 피하기 위해 간단한 텍스트 저장
-    # (Chroma는 텍스트나 임베딩이 필수이므로 의미 없는 값 넣음)
-    state_collection.upsert(
-        ids=["etl_status"],
-        documents=["This is a system state record."], 
-        metadatas={"last_run_at": last_timestamp}
-    )
-    logger.info(f"[State] 실행 시간 업데이트 완료: {last_timestamp}")
-# ---------------------------------------------------------
-# 2. Transform logic: HTML -> Markdown -> Header Split
-# ---------------------------------------------------------
-chunk_size = 500
-chunk_overlap = 100
-unlink_regex_pattern = r'\[(.*?)\]\((.*?)\)'
-
-def to_markdown(html: str):
-    return markdownify.markdownify(html or "", heading_style="atx")
-
-def to_html(md: str):
-    return markdown.markdown(md)
-
-def process_content(original_id, user_id, title, html_content, created_at, external_link=None):
+    with _connect_state_db() as conn, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO system_state (id, last_run_at, last_run_id) VALUES (?, ?, ?)",
+            ("etl_status", last_timestamp, last_id)
+        )
+    logger.info(f"[State] 실행 시간 업데이트 완료: {last_timestamp} (id: {last_id})")
+def migrate_note_collection():
     """
-    HTML 내용을 마크다운으로 변환하고 헤더 기반으로 청킹하여 Document 리스트를 반환합니다.
-    """    
-    # [Step A] HTML -> Markdown 변환
-    # heading_style="atx"는 # 기호를 사용하도록 강제합니다 (필수)
-    # 링크 제거 정규식도 적용
-    md_content_pre = to_markdown(html_content or "")
-    found_links = re.findall(unlink_regex_pattern, md_content_pre)
-    
-    # 메타데이터용 리스트 생성
-    links_meta_dict1 = {link_url: base64.b64encode(str(i).encode()).decode() for i, (_, link_url) in enumerate(found_links)}
-    links_meta_dict2 = {base64.b64encode(str(i).encode()).decode(): link_url for i, (_, link_url) in enumerate(found_links)}
-
-    def replacer(match):
-        link_name = match.group(1)  # 첫 번째 그룹: 링크 이름
-        url = match.group(2)      # 두 번째 그룹: URL (여기서는 사용 안 함)
-        return f"[{link_name}]({links_meta_dict1[url]})"
-
-    # 3. 임베딩용 텍스트 정제 (기존 요구사항: URL 제거하고 텍스트만 남기거나 []()형태로)
-    # 여기서는 [텍스트]() 형태로 변경합니다.
-    md_content = re.sub(unlink_regex_pattern, replacer, md_content_pre)
-
-    # [Step B] 1차 청킹: 헤더(Header) 기준 분리
-    # 문서를 논리적 섹션(챕터)으로 나눕니다.
-    max_level = 1
-    from langchain_text_splitters import MarkdownHeaderTextSplitter, RecursiveCharacterTextSplitter
-    for i in range(1, 7):
-        headers_to_split_on = [
-            ("#" * int(i2), "h" + str(i2))
-        for i2 in range(1, max_level + 1)]
-        markdown_splitter = MarkdownHeaderTextSplitter(headers_to_split_on=headers_to_split_on)
-        md_header_splits = markdown_splitter.split_text(md_content)
-        if any([sys.getsizeof(d.page_content) > chunk_size for d in md_header_splits]):
-            max_level += 1
-        else:
-            break
-
-    # [Step C] 2차 청킹: 문자 수 기준 분리
-    # 헤더로 나눴어도 특정 챕터의 내용이 클 수 있으므로 안전장치로 다시 자릅니다.
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-        separators=["\n\n", "\n"]
-    )
-    
-    # Document 객체 리스트를 받아 다시 쪼갭니다.
-    final_splits = text_splitter.split_documents(md_header_splits)
+    거리 공간이나 임베딩 정밀도가 다른 기존 컬렉션은 변경할 수 없으므로, 다시 생성하고 전체 노트를 재임베딩하도록 상태를 초기화합니다.
+    정밀도 기록이 없는 컬렉션은 FP32로 임베딩된 것으로 봅니다.
+    """
+    global note_collection
+    metadata = note_collection.metadata or {}
+    if (metadata.get("hnsw:space") == COLLECTION_METADATA["hnsw:space"]
+            and metadata.get("embedding_precision", "fp32") == COLLECTION_METADATA["embedding_precision"]):
+        return
+    logger.info(f"[Migration] {COLLECTION_NAME} 컬렉션을 {COLLECTION_METADATA} 설정으로 다시 생성합니다.")
+    client.delete_collection(name=COLLECTION_NAME)
+    note_collection = client.create_collection(name=COLLECTION_NAME, embedding_function=None, metadata=COLLECTION_METADATA)
+    update_last_run_time('1970-01-01 00:00:00')
 
-    processed_data = []
-    
-    for idx, split in enumerate(final_splits):
-        # 헤더 정보가 메타데이터에 포함되어 있음 (예: {'#': '소개', '##': '배경'})
-        header_metadata = split.metadata 
-        
-        # 검색 품질을 위해 텍스트 앞에 상위 헤더 문맥을 붙여줄 수도 있음 (선택사항)
-        # 여기서는 원본 텍스트 그대로 사용
-        raw_chunk_text = split.page_content
-        if (len(raw_chunk_text) < 2):
-            continue  # 너무 짧은 청크는 무시
-        if external_link:
-            links_meta_list = [external_link]
-            chunk_text = raw_chunk_text
-        else:
-            # 현재 청크 내의 모든 링크 추출 (텍스트, URL)
-            found_links = re.findall(unlink_regex_pattern, raw_chunk_text)
-            
-            # 메타데이터용 리스트 생성 (JSON 저장을 위해 dict 리스트로)
-            # 예: [{"text": "구글", "url": "https://google.com"}, ...]
-            links_meta_list = [{"origin": title, "text": link_text, "url": links_meta_dict2[link_index]} for link_text, link_index in found_links]
-            
-            # 3. 임베딩용 텍스트 정제 (기존 요구사항: URL 제거하고 텍스트만 남기거나 []()형태로)
-            # 여기서는 [텍스트]() 형태로 변경합니다.
-            chunk_text = re.sub(unlink_regex_pattern, r'[\1]()', raw_chunk_text)
-
-
-        # 헤더 경로 문자열 생성
-        _id = f"{original_id}_{idx}"
-        header_path = "\n".join([f"{'#' * int(k[1])} {v}" for k, v in header_metadata.items()]) if header_metadata else ""
-        prefix = f"# {title}\n{header_path}\n"
-        text = f"{TEXT_PREFIX}{prefix}{chunk_text}"  # 임베딩될 텍스트
-        logger.debug("================================")
-        logger.debug(text)
-        processed_data.append({
-            "id": _id, # 유니크 ID 생성
-            "text": text,
-            "metadata": {
-                "original_id": original_id,
-                "user_id": user_id,
-                "title": title,
-                "prefix": f"{TEXT_PREFIX}{prefix}",
-                "created_at": str(created_at),
-                "with_external": external_link is not None,
-                "links": json.dumps(links_meta_list, ensure_ascii=False),
-                **header_metadata # 헤더 정보도 메타데이터로 저장
-            }
-        })
-
-        # 첨부 링크 청크 생성
-        if external_link is not None:
-            continue
-        for idx2, link in enumerate(links_meta_list):
-            if idx2 == 0:
-                logger.info(f"{title}[{idx}](links: {len(links_meta_list)}")
-            preview = get_link_preview(link["url"])
-            processed_data += process_content(f"{_id}_{idx2}", user_id, preview.get("title"), preview.get("description"), created_at, link)
-    return processed_data
+migrate_note_collection()
 
+def is_up_to_date(last_update, last_run, last_id=None):
+    """
+    DB의 최근 수정 노트 (수정 시간, ID)가 마지막으로 저장한 위치 이하인지 확인합니다. 비교할 수 없으면 False를 반환합니다.
+    """
+    try:
+        update_time, update_id = last_update
+        update_time = datetime.fromisoformat(str(update_time))
+        run_time = datetime.fromisoformat(str(last_run))
+    except (TypeError, ValueError):
+        return False
+    if update_time != run_time:
+        return update_time < run_time
+    return last_id is None or update_id <= last_id
 # ---------------------------------------------------------
 # 3. Main Pipeline
 # ---------------------------------------------------------
-def run_pipeline():
-    # A. 마지막 실행 시간 로드
-    last_run = get_last_run_time()
-    df = fetch_notes_from_db(last_run)
-    if df.empty:
-        return
-
-    # ChromaDB 설정
-    ef = embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name=MODEL_NAME
-    )
-    note_collection = client.get_or_create_collection(name=COLLECTION_NAME, embedding_function=ef)
-
+max_pending_tasks = (os.cpu_count() or 1) * 2
+
+# 변환 작업 프로세스 풀은 프로세스 수명 동안 한 번만 만듭니다.
+# 모델/CUDA/Chroma 상태와 실행 중인 스레드를 가진 현재 프로세스를 fork하지 않도록 forkserver(없으면 spawn)로 시작하고,
+# 작업 프로세스에는 모델과 Chroma를 불러오지 않는 transform 모듈만 미리 불러옵니다.
+transform_executor = None
+transform_executor_lock = threading.Lock()
+
+def get_transform_executor():
+    global transform_executor
+    with transform_executor_lock:
+        if transform_executor is None:
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                mp_context = multiprocessing.get_context("forkserver")
+                mp_context.set_forkserver_preload(["transform"])
+            else:
+                mp_context = multiprocessing.get_context("spawn")
+            transform_executor = ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=mp_context)
+        return transform_executor
+
+def shutdown_transform_executor():
+    global transform_executor
+    with transform_executor_lock:
+        if transform_executor is not None:
+            transform_executor.shutdown(wait=False, cancel_futures=True)
+            transform_executor = None
+
+def limit_concurrent_tasks(executor, fn, tasks, limit):
+    """
+    tasks의 인자로 fn을 실행하되, 동시에 대기 중인 작업이 limit개를 넘지 않도록 제출하고
+    완료되는 순서대로 (인자, 완료된 future)를 반환합니다. 작업별 예외는 호출한 쪽에서 future.result()로 확인합니다.
+    """
+    pending = {}
+    for args in tasks:
+        if len(pending) >= limit:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future
+        pending[executor.submit(fn, *args)] = args
+    for future in as_completed(pending):
+        yield pending[future], future
+
+def store_notes(executor, rows):
+    """
+    노트 Row 청크 하나에 대해 변환, 기존 벡터 삭제, 저장을 수행하고 저장된 청크 수를 반환합니다.
+    변환에 실패한 노트는 기존 벡터를 그대로 두고 건너뜁니다.
+    """
     documents = []
     metadatas = []
     ids = []
+    updated_original_ids = []
 
-    updated_original_ids = df['co_id'].tolist()
-
-    # [Step 4] 기존 청크 삭제 (Clean up)
-    if updated_original_ids:
-        logger.info(f"업데이트 대상 문서 {len(updated_original_ids)}개의 기존 벡터 삭제 중...")
-        # where 절을 사용하여 삭제
-        for original_id in updated_original_ids:
-             note_collection.delete(where={"original_id": original_id})
-
-    # [Step 5] 데이터 변환
+    # [Step 4] 데이터 변환
+    # 노트 단위 변환은 CPU 바운드 작업이므로 프로세스 풀에서 병렬로 수행합니다.
+    # 변환을 먼저 끝낸 뒤 삭제하므로, 변환 중에 실패해도 기존 벡터가 지워지지 않습니다.
     logger.info("새 데이터 변환 중...")
-    for _, row in df.iterrows():
-        chunks = process_content(row['co_id'], row['us_id'], row['co_title'], row['co_description'], row['co_updated'])
+    # 대기 중인 작업 수를 제한하여 초기 전체 색인 시에도 메모리 사용량이 커지지 않도록 합니다.
+    tasks = ((row.co_id, row.us_id, row.co_title, row.co_description, row.co_updated) for row in rows)
+    for args, future in limit_concurrent_tasks(executor, process_content, tasks, max_pending_tasks):
+        try:
+            chunks = future.result()
+        except BrokenProcessPool:
+            raise
+        except Exception as e:
+            logger.warning(f"노트 {args[0]} 변환 중 오류 발생, 건너뜁니다: {e}")
+            continue
+        updated_original_ids.append(args[0])
         for chunk in chunks:
             documents.append(chunk['text'])
             metadatas.append(chunk['metadata'])
             ids.append(chunk['id'])
 
+    # [Step 5] 기존 청크 삭제 (Clean up)
+    if updated_original_ids:
+        logger.info(f"업데이트 대상 문서 {len(updated_original_ids)}개의 기존 벡터 삭제 중...")
+        # $in 조건으로 한 번의 호출에서 일괄 삭제
+        note_collection.delete(where={"original_id": {"$in": updated_original_ids}})
+
     # [Step 6] 데이터 저장
+    # Chroma는 로컬 저장소 쓰기를 직렬화하므로 저장은 한 스레드에서 순서대로 수행하고,
+    # 배치 N을 저장하는 동안 다음 배치 N+1을 임베딩하여 두 작업을 겹칩니다.
     if documents:
-        batch_size = 100
-        logger.info(f"총 {len(documents)}개의 청크를 {batch_size}개씩 나누어 저장합니다.")
-        for i in range(0, len(documents), batch_size):
-            logger.info(f"  - 청크 {i} ~ {min(i+batch_size, len(documents))} 저장 중...")
-            end = i + batch_size
-            note_collection.upsert(
-                documents=documents[i:end],
-                metadatas=metadatas[i:end],
-                ids=ids[i:end]
-            )
-        
-        # [Step 7] 상태값 업데이트 (DB 내부 컬렉션 이용)
-        max_updated_at = df['co_updated'].max()
-        update_last_run_time(max_updated_at)
-        
-        logger.info(f"작업 완료. 총 {len(documents)}개 청크 저장됨.")
+        batch_size = 250
+        logger.info(f"총 {len(documents)}개의 청크를 {batch_size}개씩 임베딩하여 저장합니다.")
+        with ThreadPoolExecutor(max_workers=1) as upsert_executor:
+            pending = None
+            for i in range(0, len(documents), batch_size):
+                end = i + batch_size
+                # Chroma의 HNSW 인덱스는 float32로만 저장하므로 int8 양자화 대신
+                # float32 ndarray를 그대로 전달하여 파이썬 float 리스트 변환을 생략합니다.
+                embeddings = model.encode(
+                    documents[i:end],
+                    batch_size=encode_batch_size,
+                    convert_to_numpy=True,
+                    normalize_embeddings=True,
+                    show_progress_bar=False
+                ).astype(np.float32, copy=False)
+                if pending is not None:
+                    pending.result()
+                logger.info(f"  - 청크 {i} ~ {min(end, len(documents))} 저장 중...")
+                pending = upsert_executor.submit(
+                    note_collection.upsert,
+                    documents=documents[i:end],
+                    embeddings=embeddings,
+                    metadatas=metadatas[i:end],
+                    ids=ids[i:end]
+                )
+            pending.result()
+    return len(documents)
+
+
+def run_pipeline():
+    # A. 마지막으로 저장한 위치 로드
+    last_run, last_id = get_last_run_time()
+
+    # 마지막 실행 이후 수정된 노트가 없으면 본 조회 없이 종료합니다.
+    last_update = fetch_last_note_update_from_db()
+    if last_update is not None and is_up_to_date(last_update, last_run, last_id):
+        return
+    total = 0
+    changed = False
+
+    try:
+        # 결과를 (co_updated, co_id) 순서의 chunksize 단위 Row 리스트로 받아 처리합니다.
+        for rows in fetch_notes_from_db(last_run, last_id):
+            if not rows:
+                continue
+            # 기존 청크 삭제만 일어나도(내용을 비우거나 삭제한 노트) 검색 결과가 바뀝니다.
+            changed = True
+            total += store_notes(get_transform_executor(), rows)
+            # 정렬된 순서로 받으므로, 페이지를 저장할 때마다 마지막 Row의 (수정 시간, ID)를 기록하여
+            # 이후 페이지에서 실패하더라도 다음 실행은 이 위치부터 이어서 처리합니다.
+            update_last_run_time(rows[-1].co_updated, rows[-1].co_id)
+    except Exception as e:
+        # 실패한 페이지는 기록하지 않았으므로 다음 실행에서 마지막으로 저장한 위치부터 다시 처리합니다.
+        logger.warning(f"파이프라인 실행 중 오류 발생: {e}")
+        if isinstance(e, BrokenProcessPool):
+            # 작업 프로세스가 비정상 종료된 풀은 재사용할 수 없으므로 다음 실행에서 새로 만듭니다.
+            shutdown_transform_executor()
+        return
+    finally:
+        if changed:
+            search_cache.clear()
 
+    if changed:
+        logger.info(f"작업 완료. 총 {total}개 청크 저장됨.")
+
+
+# 노트가 변경되면 kick_pipeline()으로 다음 실행을 즉시 시작합니다.
+# 신호가 없더라도 pipeline_timeout 초마다 실행하여 누락된 변경을 복구합니다.
+pipeline_kick = asyncio.Event()
+pipeline_loop = None
+pipeline_timeout = 30
+
+def kick_pipeline():
+    """
+    파이프라인의 다음 실행을 즉시 시작하도록 알립니다. 어느 스레드에서든 호출할 수 있습니다.
+    """
+    if pipeline_loop is not None:
+        pipeline_loop.call_soon_threadsafe(pipeline_kick.set)
 
 async def embedding():
+    global pipeline_loop
     loop = asyncio.get_running_loop()
+    pipeline_loop = loop
     try:
         while True:
             # [핵심] 동기 함수(run_pipeline)를 별도 스레드 풀에서 실행
             # 이렇게 해야 메인 루프가 멈추지 않아 cancel() 신호를 받을 수 있음
             await loop.run_in_executor(None, run_pipeline)
-            await asyncio.sleep(5)
+            try:
+                await asyncio.wait_for(pipeline_kick.wait(), timeout=pipeline_timeout)
+            except asyncio.TimeoutError:
+                pass
+            pipeline_kick.clear()
             
     except asyncio.CancelledError:
         # task.cancel()이 호출되면 이 블록이 실행됨
         logger.warning("Embedding task was cancelled via signal!")
+        shutdown_transform_executor()
         raise  # 에러를 다시 던져줘야 완전히 종료됨
 
-def search(user_id: int, query: str, exact: bool, size: int, page: int, withHidden: bool, withExternal: bool) -> str:
+# 반복 검색은 Chroma를 조회하지 않고 이전 결과를 재사용합니다. (SEARCH_CACHE_THRESHOLD < 1이면 의미가 거의 같은 검색도 재사용)
+# 파이프라인이 청크를 삭제하거나 저장하면 결과가 바뀔 수 있으므로 캐시를 비웁니다.
+search_cache = SemanticCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_THRESHOLD)
+
+def embed_queries(queries):
+    """
+    검색어 목록을 문서 임베딩과 같은 모델로 한 번에 임베딩하고 정규화합니다.
+    """
+    return model.encode([f"{QUERY_PREFIX}{query}" for query in queries], batch_size=query_batch_size, convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False).astype(np.float32, copy=False)
+
+def embed_query(query: str):
+    return embed_queries([query])[0]
+
+class QueryBatcher:
+    """
+    동시에 들어온 검색어를 짧은 시간 창(window) 동안 모아 한 번의 model.encode로 임베딩합니다.
+    사용자마다 where 조건이 다르므로 Chroma 조회는 요청별로 수행하고, 임베딩만 묶어서 계산합니다.
+    """
+    def __init__(self, max_batch_size: int = 32, window: float = 0.005):
+        self.max_batch_size = max_batch_size
+        self.window = window
+        self.queue = asyncio.Queue()
+        self.task = None
+
+    async def embed(self, query: str):
+        # 배치 작업은 첫 요청이 들어온 이벤트 루프에서 시작합니다.
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((query, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(items) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                vectors = await asyncio.to_thread(embed_queries, [query for query, _ in items])
+                for (_, future), vector in zip(items, vectors):
+                    if not future.done():
+                        future.set_result(vector)
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+
+query_batcher = QueryBatcher()
+
+def warm_up():
+    """
+    첫 검색 요청이 모델 초기화와 인덱스 로딩 비용을 치르지 않도록 더미 검색을 한 번 수행합니다.
+    """
     try:
-        client = chromadb.PersistentClient(path=VECTOR_DB_PATH)
-        ef = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name=MODEL_NAME
-        )
-        collection = client.get_collection(name=COLLECTION_NAME, embedding_function=ef)
-        
-        where = {"user_id": user_id}
-        if not withExternal:
-            where = {
-                "$and": [
-                    where,
-                    {"with_external" : False}
-                ]
-            }
-
-        # 벡터 검색 수행
-        results = collection.query(
-            query_texts=[f"{QUERY_PREFIX}{query}"],
+        note_collection.query(query_embeddings=[embed_query("warmup")], n_results=1)
+    except Exception as e:
+        logger.warning(f"Warm-up query failed: {e}")
+
+def _search_where(user_id: int, withExternal: bool):
+    where = {"user_id": user_id}
+    if not withExternal:
+        where = {
+            "$and": [
+                where,
+                {"with_external" : False}
+            ]
+        }
+    return where
+
+def _paginate_results(results, size: int, page: int, withHidden: bool):
+    offset = size * page
+    paginated_output = {
+        "ids": [],
+        "distances": [] if results.get("distances") else None,
+        "metadatas": [] if results.get("metadatas") else None,
+        "documents": [] if results.get("documents") else None
+    }
+
+    for i in range(len(results["ids"])):
+        filtered_indices = []
+        for idx, meta in enumerate(results["metadatas"][i]):
+            title = meta.get("title", "")
+            if withHidden or not (title.startswith('.') or '/.' in title):
+                filtered_indices.append(idx)
+        target_indices = filtered_indices[offset : offset + size]
+
+        for key in ["ids", "distances", "metadatas", "documents"]:
+            if paginated_output[key] is not None:
+                page_data = [results[key][i][idx] for idx in target_indices]
+                paginated_output[key].append(page_data)
+    return paginated_output
+
+def search(user_id: int, query: str, exact: bool, size: int, page: int, withHidden: bool, withExternal: bool, query_embedding=None) -> str:
+    try:
+        where = _search_where(user_id, withExternal)
+
+        if query_embedding is None:
+            query_embedding = embed_query(query)
+        # exact 검색은 본문 포함 조건이 붙어 일반 검색과 결과가 다르므로 exact 여부를 키에 포함합니다.
+        # exact 검색이거나 유사도 임계값이 1 이상(기본값)이면 검색어가 정확히 같을 때만 재사용하므로 검색어도 키에 포함합니다.
+        match_query = exact or search_cache.threshold >= 1.0
+        cache_key = (user_id, exact, query if match_query else None, size, page, withHidden, withExternal)
+        # 조회 중에 파이프라인이 캐시를 비우면 이 결과는 저장하지 않도록 세대를 먼저 읽어 둡니다.
+        generation = search_cache.generation
+        cached = search_cache.get(cache_key, query_embedding)
+        if cached is not None:
+            return cached
+
+        # 벡터 검색 수행 (모듈 단위로 재사용하는 모델과 컬렉션 사용)
+        results = note_collection.query(
+            query_embeddings=[query_embedding],
             where=where,
             where_document={"$contains": query} if exact else None,
             n_results=size * (page + 1),
         )
-        offset = size * page
-        paginated_output = {
-            "ids": [],
-            "distances": [] if results.get("distances") else None,
-            "metadatas": [] if results.get("metadatas") else None,
-            "documents": [] if results.get("documents") else None
-        }
-
-        for i in range(len(results["ids"])):
-            filtered_indices = []
-            for idx, meta in enumerate(results["metadatas"][i]):
-                title = meta.get("title", "")
-                if withHidden or not (title.startswith('.') or '/.' in title):
-                    filtered_indices.append(idx)
-            target_indices = filtered_indices[offset : offset + size]
-
-            for key in ["ids", "distances", "metadatas", "documents"]:
-                if paginated_output[key] is not None:
-                    page_data = [results[key][i][idx] for idx in target_indices]
-                    paginated_output[key].append(page_data)
+        paginated_output = _paginate_results(results, size, page, withHidden)
+        search_cache.put(cache_key, query_embedding, paginated_output, generation)
         return paginated_output
 
     except Exception as e:
-        return {"error": f"검색 중 오류 발생: {str(e)}"}
\ No newline at end of file
+        return {"error": f"검색 중 오류 발생: {str(e)}"}
+
+# 한 번의 호출에서 처리할 최대 검색어 수 (임베딩 배치와 조회 결과 크기를 제한합니다)
+max_batch_queries = 10
+
+def search_many(user_id: int, queries: list, size: int, page: int, withHidden: bool, withExternal: bool):
+    """
+    여러 검색어를 한 번의 임베딩 계산과 한 번의 컬렉션 조회로 검색합니다.
+    결과의 각 항목(ids, documents 등)은 queries 순서대로 검색어별 목록을 담습니다.
+    본문 포함 조건(exact)은 검색어마다 달라 한 번에 조회할 수 없으므로 지원하지 않습니다.
+    """
+    if len(queries) > max_batch_queries:
+        return {"error": f"검색어는 한 번에 최대 {max_batch_queries}개까지 검색할 수 있습니다."}
+    try:
+        query_embeddings = embed_queries(queries)
+        results = note_collection.query(
+            query_embeddings=query_embeddings,
+            where=_search_where(user_id, withExternal),
+            n_results=size * (page + 1),
+        )
+        return _paginate_results(results, size, page, withHidden)
+
+    except Exception as e:
+        return {"error": f"검색 중 오류 발생: {str(e)}"}
@@ -11,5 +11,14 @@ MODEL_NAME = os.getenv("MODEL_NAME", "intfloat/multilingual-e5-base")
 TEXT_PREFIX =  os.getenv("TEXT_PREFIX", "passage: ")
 QUERY_PREFIX =  os.getenv("QUERY_PREFIX", "query: ")
 ROOT_PATH = os.getenv("ROOT_PATH", "/agent")
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "256"))
+# 1 이상이면 검색어가 정확히 같을 때만 캐시를 재사용합니다.
+# 1 미만으로 낮추면 임베딩 유사도가 그 이상인 다른 검색어의 결과도 재사용하므로,
+# 한두 글자만 다른 짧은 검색어(예: "회의록 3월" / "회의록 5월")가 서로의 결과를 받을 수 있습니다.
+SEARCH_CACHE_THRESHOLD = float(os.getenv("SEARCH_CACHE_THRESHOLD", "1.0"))
+# GPU에서 FP16으로 임베딩할지 여부. 값을 바꾸면 저장된 임베딩과 정밀도가 달라지므로 컬렉션을 다시 임베딩합니다.
+EMBEDDING_FP16 = os.getenv("EMBEDDING_FP16", "false").lower() == "true"
+CHROMA_HOST = os.getenv("CHROMA_HOST")
+CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8000"))
 
 NOTEBOOK_API_URL = os.getenv("NOTEBOOK_API_URL")
\ No newline at end of file
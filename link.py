@@ -1,5 +1,6 @@
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from selectolax.lexbor import LexborHTMLParser
 from typing import Dict
 
 headers = {
@@ -10,22 +11,29 @@ headers = {
     "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8"
 }
 
+# 같은 호스트에 대한 연결(TCP/TLS)을 재사용하도록 세션을 공유합니다.
+session = requests.Session()
+session.headers.update(headers)
+session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=32))
+session.mount("http://", HTTPAdapter(pool_connections=16, pool_maxsize=32))
+
 def get_link_preview(url: str) -> Dict[str, str]:
     try:
-        response = requests.get(url, headers=headers, timeout=5)
+        response = session.get(url, timeout=5)
         response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
+        # lexbor(C) 파서로 파싱하고, 본문 텍스트는 og:description이 없을 때만 추출합니다.
+        tree = LexborHTMLParser(response.text)
         
         og_data = {}
         # og: 태그 추출
-        for meta in soup.find_all("meta"):
-            if meta.get("property") and meta.get("property").startswith("og:"):
-                prop = meta.get("property")[3:]  # 'og:' 접두사 제거
-                og_data[prop] = meta.get("content")
+        for meta in tree.css('meta[property^="og:"]'):
+            prop = meta.attributes.get("property")[3:]  # 'og:' 접두사 제거
+            og_data[prop] = meta.attributes.get("content")
         
+        title_node = tree.css_first("title")
         data = {
-            "title": og_data.get("title", soup.title.string.strip() if soup.title else None),
-            "description": og_data.get("description", soup.body.get_text() if soup.body else None),
+            "title": og_data["title"] if "title" in og_data else (title_node.text(strip=True) if title_node else None),
+            "description": og_data["description"] if "description" in og_data else (tree.body.text() if tree.body else None),
         }
         return data
     except Exception:
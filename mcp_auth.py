@@ -1,5 +1,8 @@
 import hashlib
+import threading
+import time
 import jwt
+from cachetools import TTLCache
 from datetime import datetime
 from starlette.requests import Request
 from starlette.responses import JSONResponse
@@ -11,6 +14,37 @@ from notebook_db import fetch_token_from_db, fetch_user_from_db
 
 ALGORITHM = "HS256"
 
+# 요청마다 DB를 조회하지 않도록 사용자/PAT 조회 결과를 짧게 캐싱합니다.
+# PAT는 백엔드에서 폐기될 수 있으므로 더 짧은 TTL을 사용합니다.
+_USER_CACHE = TTLCache(maxsize=4096, ttl=60)
+_TOKEN_CACHE = TTLCache(maxsize=4096, ttl=30)
+# 서명 검증을 마친 JWT는 (만료 시각, sub) 형태로 캐싱합니다.
+# 사용자 정보는 캐시 적중 시에도 _USER_CACHE(TTL 60초)를 거쳐 조회하므로, 삭제되거나 바뀐 계정이 더 오래 인증되지 않습니다.
+_JWT_CACHE = TTLCache(maxsize=4096, ttl=300)
+_cache_lock = threading.Lock()
+
+def _cached_fetch(cache, fetch, key):
+    with _cache_lock:
+        value = cache.get(key)
+    if value is None:
+        value = fetch(key)
+        # 조회 실패(None)는 캐싱하지 않습니다.
+        if value is not None:
+            with _cache_lock:
+                cache[key] = value
+    return value
+
+def invalidate_user(sub):
+    """
+    사용자 정보가 바뀌었을 때 해당 사용자(sub)의 캐시와 검증된 JWT 캐시를 비웁니다.
+    사용자 캐시가 먼저 만료되었더라도 JWT 캐시는 sub 기준으로 비웁니다.
+    캐시만 비우므로 토큰을 폐기하지는 않습니다. (유효한 JWT는 다음 요청에서 다시 검증됩니다)
+    """
+    with _cache_lock:
+        _USER_CACHE.pop(sub, None)
+        for token in [token for token, (_, cached_sub) in _JWT_CACHE.items() if cached_sub == sub]:
+            _JWT_CACHE.pop(token, None)
+
 def authenticate(request:Request):
     auth_header = request.headers.get("Authorization")
     # 1. 헤더 존재 여부 및 스키마 확인
@@ -25,7 +59,7 @@ def authenticate(request:Request):
         # PAT 토큰 검증
         hashed_object = hashlib.sha256(token.encode('utf-8'))
         calculated_hash = hashed_object.hexdigest()
-        stored_token = fetch_token_from_db(calculated_hash)
+        stored_token = _cached_fetch(_TOKEN_CACHE, fetch_token_from_db, calculated_hash)
         if stored_token is None:
             return JSONResponse(
                 status_code=401, 
@@ -39,12 +73,22 @@ def authenticate(request:Request):
         request.state.user = {"us_id": int(stored_token["us_id"])}
     else:
         try:
-            # 3. 토큰 디코딩 및 서명 검증
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            # 이미 검증한 토큰이면 서명 검증을 생략
+            with _cache_lock:
+                cached = _JWT_CACHE.get(token)
+            if cached and (cached[0] is None or time.time() < cached[0]):
+                sub = cached[1]
+            else:
+                # 3. 토큰 디코딩 및 서명 검증
+                payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+                sub = payload["sub"]
+                # 토큰 만료 시간(exp)이 지나면 캐시 적중으로 처리하지 않습니다.
+                with _cache_lock:
+                    _JWT_CACHE[token] = (payload.get("exp"), sub)
 
             # 4. 검증 성공 시: request.state에 사용자 정보 저장
             # (이후 라우터나 툴에서 request.state.user로 접근 가능)
-            request.state.user = fetch_user_from_db(payload["sub"])
+            request.state.user = _cached_fetch(_USER_CACHE, fetch_user_from_db, sub)
         except jwt.ExpiredSignatureError:
             return JSONResponse(
                 status_code=401, 
@@ -1,16 +1,22 @@
 import asyncio
-import json
+import hashlib
+import logging
+import orjson
+import threading
+import numpy as np
+from cachetools import LRUCache, TTLCache
 from dotenv import load_dotenv
 from contextlib import asynccontextmanager
 from fastmcp import FastMCP, settings
 from fastmcp.utilities.logging import get_logger
 from fastmcp.server.dependencies import get_http_request
 from starlette.requests import Request
-from starlette.responses import JSONResponse
+from starlette.responses import Response
 from py_eureka_client import eureka_client
 from diff_match_patch import diff_match_patch
 
-from embedding import embedding, search, to_html, to_markdown
+from embedding import embedding, kick_pipeline, query_batcher, search, search_many, warm_up
+from transform import to_html_cached, to_markdown_cached
 from mcp_auth import AuthenticationMiddleware, authenticate
 from notebook_client import NotebookClient
 
@@ -30,6 +36,13 @@ async def server_lifespan(server:FastMCP):
         instance_port=settings.get_setting("port")
     )
     
+    # 동기적으로 끝나는 코루틴은 스케줄링 없이 바로 실행되도록 eager task factory 사용 (Python 3.12+)
+    if hasattr(asyncio, "eager_task_factory"):
+        asyncio.get_running_loop().set_task_factory(asyncio.eager_task_factory)
+
+    # 검색 모델과 인덱스를 미리 로드하여 첫 요청의 지연을 서버 시작 시점으로 옮김
+    await asyncio.to_thread(warm_up)
+
     task = asyncio.create_task(embedding())
     
     yield  # 여기서 서버가 실행됨 (대기)
@@ -45,13 +58,66 @@ async def server_lifespan(server:FastMCP):
     logger.info("Stop background task completed.")
 
 
+def _dumps(obj) -> str:
+    # orjson은 UTF-8로 직렬화하므로 ensure_ascii=False와 같은 결과를 더 빠르게 얻습니다.
+    return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+
+class ORJSONResponse(Response):
+    """
+    orjson으로 직렬화하는 JSON 응답입니다.
+    """
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+
+_dmp = diff_match_patch()
+
+# 복원된 DELTA 내용을 (스냅샷 ID, DELTA 해시) 기준으로 캐싱합니다. 스냅샷 내용은 변경되지 않습니다.
+_delta_cache = LRUCache(maxsize=1024)
+_delta_cache_lock = threading.Lock()
+
+def _restore_delta(snapshot_id, base_html: str, delta: str) -> str:
+    key = (snapshot_id, hashlib.blake2b(delta.encode("utf-8"), digest_size=16).digest())
+    with _delta_cache_lock:
+        restored = _delta_cache.get(key)
+    if restored is None:
+        diffs = _dmp.diff_fromDelta(base_html, delta)
+        restored = _dmp.diff_text2(diffs)
+        with _delta_cache_lock:
+            _delta_cache[key] = restored
+    return restored
+
+# 자주 반환되는 고정 응답은 미리 직렬화해 둡니다.
+_NO_SNAPSHOTS_JSON = _dumps({"message": "수정 이력이 없습니다.", "snapshots": []})
+
+def _notebook_client() -> NotebookClient:
+    # 현재 요청의 인증 헤더로 클라이언트를 만듭니다. (연결 풀은 모든 클라이언트가 공유)
+    return NotebookClient(get_http_request().headers.get("Authorization"))
+
 mcp = FastMCP("MyNoteSearcher", middleware=[AuthenticationMiddleware()], lifespan=server_lifespan)
 
-def _search_notes(query: str, exact: bool, size: int, page: int, with_hidden: bool, with_external: bool):
-    return search(get_http_request().state.user["us_id"], query, exact, size, page, with_hidden, with_external)
+async def _search_notes(query: str, exact: bool, size: int, page: int, with_hidden: bool, with_external: bool):
+    # 요청 컨텍스트는 이벤트 루프 스레드에서 읽고, 검색어 임베딩은 동시 요청과 묶어서 계산한 뒤
+    # 블로킹 검색(ANN)은 워커 스레드에서 실행합니다.
+    user_id = get_http_request().state.user["us_id"]
+    query_embedding = await query_batcher.embed(query)
+    return await asyncio.to_thread(search, user_id, query, exact, size, page, with_hidden, with_external, query_embedding)
+
+def _format_search_results(documents, metadatas):
+    search_results = []
+    for i, doc in enumerate(documents):
+        meta = metadatas[i]
+        search_results.append({
+            "index": i + 1,
+            "title": meta['title'],
+            "original_id": meta['original_id'],
+            "content": doc
+        })
+    return search_results
 
 @mcp.tool()
-def search_notes_tool(query: str, page: int = 0, withHidden: bool = False) -> str:
+async def search_notes_tool(query: str, page: int = 0, withHidden: bool = False) -> str:
     """
     1. 사용자의 질문과 관련된 노트를 데이터베이스에서 검색합니다.
     Args:
@@ -59,31 +125,47 @@ def search_notes_tool(query: str, page: int = 0, withHidden: bool = False) -> st
         page(Optional): 0부터 시작하는 검색 결과 페이지 번호 (default: 0)
         withHidden(Optional, Boolean): 숨김 노트 포함 여부 (default: false)
     """
-    results = _search_notes(query, False, 20, page, withHidden, True)
+    results = await _search_notes(query, False, 20, page, withHidden, True)
     
     if results.get("error"):
-        return json.dumps({"error": results["error"]}, ensure_ascii=False)
+        return _dumps({"error": results["error"]})
     
     if not results.get('documents') or not results['documents'][0]:
-        return json.dumps({"query": query, "results": [], "message": "관련된 내용을 찾을 수 없습니다."}, ensure_ascii=False)
+        return _dumps({"query": query, "results": [], "message": "관련된 내용을 찾을 수 없습니다."})
 
-    search_results = []
-    for i, doc in enumerate(results['documents'][0]):
-        meta = results['metadatas'][0][i]
-        search_results.append({
-            "index": i + 1,
-            "title": meta['title'],
-            "original_id": meta['original_id'],
-            "content": doc
-        })
-        
-    return json.dumps({
+    return _dumps({
         "query": query,
-        "results": search_results
-    }, ensure_ascii=False)
+        "results": _format_search_results(results['documents'][0], results['metadatas'][0])
+    })
+
+@mcp.tool()
+async def search_notes_batch_tool(queries: list[str], page: int = 0, withHidden: bool = False) -> str:
+    """
+    1-1. 여러 질문과 관련된 노트를 한 번에 검색합니다. 여러 키워드를 각각 검색해야 할 때 사용합니다.
+    Args:
+        queries: 검색할 질문이나 키워드 목록, 최대 10개 (예: ["파이썬 프로젝트 아이디어", "이번 주 회의록"])
+        page(Optional): 0부터 시작하는 검색 결과 페이지 번호 (default: 0)
+        withHidden(Optional, Boolean): 숨김 노트 포함 여부 (default: false)
+    """
+    if not queries:
+        return _dumps({"results": []})
+    user_id = get_http_request().state.user["us_id"]
+    results = await asyncio.to_thread(search_many, user_id, queries, 20, page, withHidden, True)
+
+    if results.get("error"):
+        return _dumps({"error": results["error"]})
+
+    documents = results.get('documents') or [[] for _ in queries]
+    metadatas = results.get('metadatas') or [[] for _ in queries]
+    return _dumps({
+        "results": [
+            {"query": query, "results": _format_search_results(documents[i], metadatas[i])}
+            for i, query in enumerate(queries)
+        ]
+    })
 
 @mcp.custom_route("/search", methods=["GET"])
-def search_notes(request: Request):
+async def search_notes(request: Request):
     response = authenticate(request)
     if response:
         return response
@@ -93,59 +175,93 @@ def search_notes(request: Request):
     exact = request.query_params.get("exact") == "true"
     with_hidden = request.query_params.get("withHidden") == "true"
     with_external = request.query_params.get("withExternal") == "true"
-    results = _search_notes(query, exact, size, page, with_hidden, with_external)
+    results = await _search_notes(query, exact, size, page, with_hidden, with_external)
     if results.get("error"):
         raise Exception(results["error"])
+    # 결과 목록은 한 번씩만 꺼내고, 거리 값은 한 번의 변환으로 파이썬 float 리스트로 만듭니다.
+    ids, metas, docs = results['ids'][0], results['metadatas'][0], results['documents'][0]
+    dists = np.asarray(results['distances'][0], dtype=np.float64).tolist()
     formatted_results = [
-    {
-        "id": id,
-        "distance": dist,
-        "metadata": meta,
-        "document": doc
-    }
-    for id, dist, meta, doc in zip(
-        results['ids'][0], 
-        results['distances'][0], 
-        results['metadatas'][0], 
-        results['documents'][0]
-    )
-]
+        {
+            "id": id,
+            "distance": dist,
+            "metadata": meta,
+            "document": doc
+        }
+        for id, dist, meta, doc in zip(ids, dists, metas, docs)
+    ]
 
-    logger.info(f"--- 질문: {query} ---")
-    for i, item in enumerate(formatted_results):
-        logger.info(f"순위 {i+1}:")
-        logger.info(f"메타데이터: {item['metadata']}")
-        logger.info(f"거리(유사도 역수): {item['distance']}")
-        logger.info(f"내용: \n{item['document']}\n")
-        logger.info("-" * 20)
-    return JSONResponse(formatted_results)
+    logger.info(f"--- 질문: {query} --- (결과 {len(formatted_results)}건)")
+    # 결과 본문 로그는 DEBUG 레벨에서만 포맷팅하고 출력합니다.
+    # 결과별 로그는 한 번의 호출로 모아서 출력합니다.
+    if logger.isEnabledFor(logging.DEBUG):
+        lines = []
+        for i, item in enumerate(formatted_results):
+            lines.append(f"순위 {i+1}:")
+            lines.append(f"메타데이터: {item['metadata']}")
+            lines.append(f"거리(유사도 역수): {item['distance']}")
+            lines.append(f"내용: \n{item['document']}\n")
+            lines.append("-" * 20)
+        logger.debug("\n".join(lines))
+    return ORJSONResponse(formatted_results)
+
+@mcp.custom_route("/kick-etl", methods=["POST"])
+async def kick_etl(request: Request):
+    """
+    노트가 변경되었음을 알려 임베딩 파이프라인을 즉시 실행합니다.
+    """
+    response = authenticate(request)
+    if response:
+        return response
+    kick_pipeline()
+    return ORJSONResponse({"status": "accepted"}, status_code=202)
+
+# 제목 검색용 노트 목록과 소문자 제목 배열을 사용자별로 짧게 캐싱합니다. 노트를 수정하면 비웁니다.
+_note_index_cache = TTLCache(maxsize=256, ttl=10)
+_note_index_lock = threading.Lock()
+
+def _fetch_note_index(with_hidden: bool):
+    auth_header = get_http_request().headers.get("Authorization")
+    key = (auth_header, with_hidden)
+    with _note_index_lock:
+        cached = _note_index_cache.get(key)
+    if cached is None:
+        notes = NotebookClient(auth_header).fetch_contents(["NOTE"], with_hidden)
+        lowercase_titles = np.array([(note.get("title") or "").lower() for note in notes], dtype=str)
+        cached = (notes, lowercase_titles)
+        with _note_index_lock:
+            _note_index_cache[key] = cached
+    return cached
+
+def _invalidate_note_index():
+    with _note_index_lock:
+        _note_index_cache.clear()
 
 @mcp.tool()
-def search_notes(title: str = None, withHidden: bool = False) -> str:
+def list_notes(title: str = None, withHidden: bool = False) -> str:
     """
     2. 다건 노트 조회
     노트 제목을 포함하는 검색을 지원하며 본문 내용을 markdown으로 제공합니다.
     """
-    client = NotebookClient()
-    notes = client.fetch_contents(["NOTE"], withHidden)
+    notes, lowercase_titles = _fetch_note_index(withHidden)
+    if title:
+        # 소문자 제목 배열에서 부분 문자열 검색을 한 번에 수행
+        matched = np.flatnonzero(np.char.find(lowercase_titles, title.lower()) >= 0)
+        notes = [notes[i] for i in matched]
+
     results = []
-    title_param = note.get("title", "").lower()
-    
     for note in notes:
-        if title and title.lower() not in title_param:
-            continue
-            
         desc = note.get("description", "")
-        preview = to_markdown(desc or "")
+        preview = to_markdown_cached(desc or "")
         results.append({
             "id": note['id'],
-            "title": str(title),
+            "title": note.get("title"),
             "preview": preview
         })
-    return json.dumps({"count": len(results), "notes": results}, ensure_ascii=False)
+    return _dumps({"count": len(results), "notes": results})
 
 @mcp.tool()
-def get_note_snapshots(note_id: int, page: int = 0) -> str:
+async def get_note_snapshots(note_id: int, page: int = 0) -> str:
     """
     특정 노트의 수정 이력(SNAPSHOT 및 DELTA)을 조회합니다.
     DELTA 타입은 기준 SNAPSHOT과 결합하여 전체 내용을 복원한 후 마크다운으로 반환합니다.
@@ -154,18 +270,21 @@ def get_note_snapshots(note_id: int, page: int = 0) -> str:
         note_id: 이력을 조회할 원본 노트의 ID (parentId)
         page: 조회할 페이지 번호 (기본값: 0)
     """
-    client = NotebookClient()
-    dmp = diff_match_patch()
+    client = _notebook_client()
     
     # 1. SNAPSHOT 및 DELTA 타입만 조회
-    contents = client.fetch_contents(["SNAPSHOT", "DELTA"], True, note_id, page)
-    snapshots = client.fetch_contents(["SNAPSHOT"], True, note_id, 0)
+    # 이력 페이지는 대부분 DELTA를 포함하므로 기준 SNAPSHOT 목록도 동시에 조회합니다.
+    contents, snapshots = await asyncio.gather(
+        asyncio.to_thread(client.fetch_contents, ["SNAPSHOT", "DELTA"], True, note_id, page),
+        asyncio.to_thread(client.fetch_contents, ["SNAPSHOT"], True, note_id, 0),
+    )
     
     if not contents:
-        return json.dumps({"message": "수정 이력이 없습니다.", "snapshots": []}, ensure_ascii=False)
+        return _NO_SNAPSHOTS_JSON
 
-    # 2. 현재 페이지 내 스냅샷 매핑 구축
-    snapshot_map = {item['id']: item for item in snapshots}
+    # 2. 현재 페이지 및 기준 스냅샷 매핑 구축
+    snapshot_map = {snapshot['id']: snapshot for snapshot in snapshots}
+    snapshot_map.update({item['id']: item for item in contents if item.get('type') == 'SNAPSHOT'})
     
     results = []
     for item in contents:
@@ -180,8 +299,7 @@ def get_note_snapshots(note_id: int, page: int = 0) -> str:
                 if base_snapshot:
                     try:
                         # diff-match-patch를 사용하여 원래 내용 확인
-                        diffs = dmp.diff_fromDelta(base_snapshot['description'], description_html)
-                        description_html = dmp.diff_text2(diffs)
+                        description_html = _restore_delta(snapshot_id, base_snapshot['description'], description_html)
                     except Exception as e:
                         logger.error(f"Delta restoration failed: {str(e)}")
                         continue
@@ -190,7 +308,7 @@ def get_note_snapshots(note_id: int, page: int = 0) -> str:
                     continue
         
         # 4. SNAPSHOT 및 복원된 DELTA 모두 to_markdown 처리
-        markdown_content = to_markdown(description_html or "")
+        markdown_content = to_markdown_cached(description_html or "")
         
         results.append({
             "id": item.get('id'),
@@ -199,11 +317,11 @@ def get_note_snapshots(note_id: int, page: int = 0) -> str:
             "content": markdown_content,
         })
         
-    return json.dumps({
+    return _dumps({
         "note_id": note_id,
         "page": page,
         "snapshots": results
-    }, ensure_ascii=False)
+    })
 
 @mcp.tool()
 def write_note(title: str, content_markdown: str) -> str:
@@ -213,28 +331,32 @@ def write_note(title: str, content_markdown: str) -> str:
     해당 제목의 노트가 없으면: 새 노트를 생성합니다.
     노트의 내용(content_markdown)은 markdown 포맷으로 작성해야 합니다.
     """
-    client = NotebookClient()
+    client = _notebook_client()
     try:
         existing_note = client.get_note_by_title(title)
-        content_html = to_html(content_markdown)
+        content_html = to_html_cached(content_markdown)
         if existing_note:
             client.update_note_content(existing_note["id"], existing_note, content_html)
-            return json.dumps({
+            kick_pipeline()
+            _invalidate_note_index()
+            return _dumps({
                 "status": "success",
                 "action": "update",
                 "title": title,
                 "id": existing_note['id']
-            }, ensure_ascii=False)
+            })
         else:
             new_id = client.create_note(title, content_html)
-            return json.dumps({
+            kick_pipeline()
+            _invalidate_note_index()
+            return _dumps({
                 "status": "success",
                 "action": "create",
                 "title": title,
                 "id": new_id
-            }, ensure_ascii=False)
+            })
     except Exception as e:
-        return json.dumps({"status": "error", "message": str(e)}, ensure_ascii=False)
+        return _dumps({"status": "error", "message": str(e)})
 
 @mcp.tool()
 def move_note(old_title: str, new_title: str) -> str:
@@ -243,27 +365,31 @@ def move_note(old_title: str, new_title: str) -> str:
     노트의 제목을 변경합니다. (예: 'Folder/OldName' -> 'Folder/NewName')
     노트가 이미 존재할 경우 '노트 쓰기'를 사용하여 내용을 덮어쓰기 해야 합니다.
     """
-    client = NotebookClient()
+    client = _notebook_client()
     try:
-        if client.get_note_by_title(new_title):
-            return json.dumps({
+        # 두 제목을 한 번의 조회로 확인
+        notes = client.get_notes_by_titles([old_title, new_title])
+        if new_title in notes:
+            return _dumps({
                 "status": "error", 
                 "message": f"A note with the title '{new_title}' already exists."
-            }, ensure_ascii=False)
+            })
 
-        note = client.get_note_by_title(old_title)
+        note = notes.get(old_title)
         if not note:
-            return json.dumps({
+            return _dumps({
                 "status": "error", 
                 "message": f"Note '{old_title}' not found."
-            }, ensure_ascii=False)
+            })
 
         client.rename_note(note["id"], note, new_title)
-        return json.dumps({
+        kick_pipeline()
+        _invalidate_note_index()
+        return _dumps({
             "status": "success",
             "old_title": old_title,
             "new_title": new_title,
             "note_id": note["id"]
-        }, ensure_ascii=False)
+        })
     except Exception as e:
-        return json.dumps({"status": "error", "message": str(e)}, ensure_ascii=False)
\ No newline at end of file
+        return _dumps({"status": "error", "message": str(e)})
\ No newline at end of file
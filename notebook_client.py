@@ -1,16 +1,35 @@
 import re
+import orjson
 import requests
-from typing import List, Optional, Dict, Any, Tuple
-from fastmcp.server.dependencies import get_http_request
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Iterator, List, Optional, Dict, Any, Tuple
 
 from env import NOTEBOOK_API_URL
 
+PAGE_SIZE = 256
+# 제목으로 노트를 찾을 때 조회할 최대 페이지 수 (최근 PAGE_SIZE * TITLE_LOOKUP_MAX_PAGES개)
+# 없는 제목(새 노트 생성, 이동할 제목 확인)은 이 한도까지 조회해야 하므로 전체 노트를 훑지 않도록 제한합니다.
+TITLE_LOOKUP_MAX_PAGES = 4
+
+# 요청 간에 keep-alive 연결을 재사용하도록 세션은 프로세스 전체에서 공유합니다.
+# (재시도는 urllib3 기본값에 따라 연결 오류와 멱등 메서드에만 적용됩니다)
+session = requests.Session()
+adapter = HTTPAdapter(pool_connections=10, pool_maxsize=100, max_retries=Retry(total=2))
+session.mount("https://", adapter)
+session.mount("http://", adapter)
+
 class NotebookClient:
-    def __init__(self):
+    def __init__(self, auth_header: Optional[str] = None):
+        """
+        auth_header: 백엔드 API 호출에 그대로 전달할 Authorization 헤더 값
+        """
         self.base_url = NOTEBOOK_API_URL
-        self.headers = self._get_headers(get_http_request().headers.get("Authorization"))
+        self.session = session
+        self.headers = self._get_headers(auth_header)
 
     def _get_headers(self, auth) -> Dict[str, str]:
+        # 요청 본문은 orjson으로 직접 직렬화하므로 Content-Type을 명시합니다.
         headers = {"Content-Type": "application/json"}
         if auth:
             headers["Authorization"] = auth
@@ -20,38 +39,49 @@ class NotebookClient:
         params = {
             "sort": "id,DESC",
             "types": ",".join(types),
-            "size": 256,
+            "size": PAGE_SIZE,
             "page": page,
             "withHidden": with_hidden
         }
         if parent_id is not None:
             params["parentId"] = parent_id
 
-        response = requests.get(f"{self.base_url}/api/v1/content", params=params, headers=self.headers, timeout=10)
+        response = self.session.get(f"{self.base_url}/api/v1/content", params=params, headers=self.headers, timeout=10)
         response.raise_for_status()
         return response.json().get("value", [])
 
+    def iter_contents(self, types: List[str], with_hidden: bool, parent_id: Optional[int] = None, max_pages: Optional[int] = None) -> Iterator[List[Dict[str, Any]]]:
+        """
+        페이지 단위로 컨텐츠를 조회하여 순서대로 반환합니다. 마지막 페이지(PAGE_SIZE 미만)나 max_pages개를 조회하면 종료합니다.
+        """
+        page = 0
+        while max_pages is None or page < max_pages:
+            contents = self.fetch_contents(types, with_hidden, parent_id, page)
+            if contents:
+                yield contents
+            if len(contents) < PAGE_SIZE:
+                return
+            page += 1
+
     def get_note_by_title(self, title: str) -> Optional[Dict[str, Any]]:
-        notes = self.fetch_contents(["NOTE"], True)
-        for note in notes:
-            if note.get("title") == title:
-                return note
-        return None
+        return self.get_notes_by_titles([title]).get(title)
 
-    def create_note(self, title: str, content_html: str) -> int:
-        payload = {
-            "title": title,
-            "description": content_html,
-            "type": "NOTE",
-            "parentId": 0,
-            "userId": 0,
-            "order": 0,
-            "input": title,
-            "option": {}
-        }
-        resp = requests.post(f"{self.base_url}/api/v1/content", json=payload, headers=self.headers)
-        resp.raise_for_status()
-        return resp.json().get("id")
+    def get_notes_by_titles(self, titles: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        여러 제목의 노트를 찾아 {제목: 노트} 형태로 반환합니다.
+        최근 노트부터 최대 TITLE_LOOKUP_MAX_PAGES 페이지를 조회하며, 모든 제목을 찾으면 나머지 페이지는 조회하지 않습니다.
+        """
+        found = {}
+        for notes in self.iter_contents(["NOTE"], True, max_pages=TITLE_LOOKUP_MAX_PAGES):
+            page_by_title = {}
+            for note in notes:
+                page_by_title.setdefault(note.get("title"), note)
+            for title in titles:
+                if title not in found and title in page_by_title:
+                    found[title] = page_by_title[title]
+            if len(found) == len(set(titles)):
+                break
+        return found
 
     def _create_snapshot(self, parent_id: int, note_data: Dict[str, Any]) -> None:
         """
@@ -59,15 +89,12 @@ class NotebookClient:
         notebook.ts의 saveContents 로직 참조:
         const snapshot = { ...content, type: 'SNAPSHOT', id: undefined, parentId: savedId };
         """
-        snapshot_payload = note_data.copy()
-        snapshot_payload["type"] = "SNAPSHOT"
-        snapshot_payload["parentId"] = parent_id
+        snapshot_payload = {**note_data, "type": "SNAPSHOT", "parentId": parent_id}
         
         # id는 새로 생성되어야 하므로 제거 (또는 None 설정)
-        if "id" in snapshot_payload:
-            del snapshot_payload["id"]
+        snapshot_payload.pop("id", None)
             
-        requests.post(f"{self.base_url}/api/v1/content", json=snapshot_payload, headers=self.headers).raise_for_status()
+        self.session.post(f"{self.base_url}/api/v1/content", data=orjson.dumps(snapshot_payload), headers=self.headers).raise_for_status()
 
     def create_note(self, title: str, content_html: str) -> int:
         """
@@ -83,7 +110,7 @@ class NotebookClient:
             "input": title,
             "option": {}
         }
-        resp = requests.post(f"{self.base_url}/api/v1/content", json=payload, headers=self.headers)
+        resp = self.session.post(f"{self.base_url}/api/v1/content", data=orjson.dumps(payload), headers=self.headers)
         resp.raise_for_status()
         
         new_id = resp.json().get("id")
@@ -107,7 +134,7 @@ class NotebookClient:
             "ids": [note_id],
             "updated": updated_data
         }
-        requests.patch(f"{self.base_url}/api/v1/content", json=payload, headers=self.headers).raise_for_status()
+        self.session.patch(f"{self.base_url}/api/v1/content", data=orjson.dumps(payload), headers=self.headers).raise_for_status()
         
         # 스냅샷 생성
         self._create_snapshot(note_id, updated_data)
@@ -126,7 +153,7 @@ class NotebookClient:
             "ids": [note_id],
             "updated": updated_data
         }
-        requests.patch(f"{self.base_url}/api/v1/content", json=payload, headers=self.headers).raise_for_status()
+        self.session.patch(f"{self.base_url}/api/v1/content", data=orjson.dumps(payload), headers=self.headers).raise_for_status()
         
         # 스냅샷 생성
         self._create_snapshot(note_id, updated_data)
@@ -1,5 +1,4 @@
-import pandas as pd
-from sqlalchemy import create_engine
+from sqlalchemy import bindparam, create_engine, text
 from fastmcp.utilities.logging import get_logger
 
 from env import DB_USER, DB_PASSWORD
@@ -10,17 +9,28 @@ logger = get_logger(__name__)
 
 logger.info("MySQL 데이터베이스 연결 중...")
 try:
-    engine = create_engine(DB_CONNECTION_STR)
+    # 백그라운드 ETL이 계속 실행되므로 유휴 연결 끊김에 대비해 pre-ping/recycle을 사용하고,
+    # LIFO로 최근 사용한 연결을 재사용합니다. 인증과 ETL이 동시에 연결을 사용하므로 풀을 넉넉하게 둡니다.
+    engine = create_engine(
+        DB_CONNECTION_STR,
+        pool_size=20,
+        max_overflow=40,
+        pool_pre_ping=True,
+        pool_recycle=1800,
+        pool_use_lifo=True
+    )
 except Exception as e:
     logger.warning(f"MySQL 연결 오류: {e}")
     raise e
 
+fetch_token_query = text("SELECT us_id, pa_token, pa_expired FROM personal_access_token where pa_token=:token LIMIT 1")
+fetch_user_query = text("SELECT us_id FROM db1_account.user where us_username=:username LIMIT 1")
+
 def fetch_token_from_db(token):
     try:
-        query = "SELECT us_id, pa_token, pa_expired FROM personal_access_token where pa_token=%(token)s"
-        
-        df = pd.read_sql(query, engine, params={'token': token})
-        return df.iloc[0].to_dict()
+        with engine.connect() as conn:
+            row = conn.execute(fetch_token_query, {'token': token}).mappings().first()
+        return dict(row) if row else None
     except Exception as e:
         logger.warning(f"MySQL 연결 또는 쿼리 오류: {e}")
         return None
@@ -29,25 +39,65 @@ def fetch_token_from_db(token):
 def fetch_user_from_db(username):
     try:
         # 실제 테이블 구조에 맞게 쿼리 수정
-        # content 컬럼에는 HTML이 들어있다고 가정
-        query = "SELECT us_id FROM db1_account.user where us_username=%(username)s"
-        
-        df = pd.read_sql(query, engine, params={'username': username})
-        return df.iloc[0].to_dict()
+        with engine.connect() as conn:
+            row = conn.execute(fetch_user_query, {'username': username}).mappings().first()
+        return dict(row) if row else None
     except Exception as e:
         logger.warning(f"MySQL 연결 또는 쿼리 오류: {e}")
         return None
 
 
-def fetch_notes_from_db(last_run_time):
+# 파이프라인이 주기적으로 실행하는 쿼리이므로 모듈 로드 시 한 번만 구성합니다.
+last_note_update_query = text("SELECT co_updated, co_id FROM content where co_type='NOTE' ORDER BY co_updated DESC, co_id DESC LIMIT 1")
+# 처리 중에 커서를 열어 두지 않도록 (co_updated, co_id) 순서의 키셋 페이지 단위로 조회합니다.
+fetch_notes_select = "SELECT co_id, us_id, co_title, co_description, co_updated FROM content where co_type='NOTE'"
+fetch_notes_query = text(
+    f"{fetch_notes_select} and co_updated > :last_run ORDER BY co_updated, co_id LIMIT :limit"
+).bindparams(bindparam('last_run'), bindparam('limit'))
+fetch_notes_after_query = text(
+    f"{fetch_notes_select} and (co_updated > :last_updated or (co_updated = :last_updated and co_id > :last_id))"
+    " ORDER BY co_updated, co_id LIMIT :limit"
+).bindparams(bindparam('last_updated'), bindparam('last_id'), bindparam('limit'))
+
+def fetch_notes_from_db(last_run_time, last_id=None, chunksize=500):
+    """
+    (last_run_time, last_id) 이후에 수정된 노트를 (co_updated, co_id) 순서로 chunksize 단위의 Row 리스트로 순차 반환합니다.
+    last_id가 None이면 last_run_time 시각의 노트는 모두 처리된 것으로 보고 그 이후부터 조회합니다.
+    페이지마다 연결을 새로 빌려 조회하므로 반환된 Row를 처리하는 동안에는 커서를 열어 두지 않습니다.
+    조회에 실패하면 예외를 다시 발생시켜, 호출한 쪽이 일부만 처리한 상태로 실행 시간을 갱신하지 않도록 합니다.
+    """
+    if last_id is None:
+        query = fetch_notes_query
+        params = {'last_run': last_run_time, 'limit': chunksize}
+    else:
+        query = fetch_notes_after_query
+        params = {'last_updated': last_run_time, 'last_id': last_id, 'limit': chunksize}
+    while True:
+        try:
+            # 실제 테이블 구조에 맞게 쿼리 수정
+            # content 컬럼에는 HTML이 들어있다고 가정
+            with engine.connect() as conn:
+                rows = conn.execute(query, params).fetchall()
+        except Exception as e:
+            logger.warning(f"MySQL 연결 또는 쿼리 오류: {e}")
+            raise
+        if rows:
+            logger.info(f"DB에서 {last_run_time} 이후에 수정된 {len(rows)}개의 노트를 가져왔습니다.")
+            yield rows
+        if len(rows) < chunksize:
+            return
+        query = fetch_notes_after_query
+        params = {'last_updated': rows[-1].co_updated, 'last_id': rows[-1].co_id, 'limit': chunksize}
+
+
+def fetch_last_note_update_from_db():
+    """
+    가장 최근에 수정된 노트의 (수정 시간, ID)를 반환합니다. 노트가 없거나 조회에 실패하면 None을 반환합니다.
+    """
     try:
-        # 실제 테이블 구조에 맞게 쿼리 수정
-        # content 컬럼에는 HTML이 들어있다고 가정
-        query = "SELECT co_id, us_id, co_title, co_description, co_updated FROM content where co_updated > %(last_run)s and co_type='NOTE'"
-        
-        df = pd.read_sql(query, engine, params={'last_run': last_run_time})
-        logger.info(f"DB에서 {last_run_time} 이후에 수정된 {len(df)}개의 노트를 가져왔습니다.")
-        return df
+        with engine.connect() as conn:
+            row = conn.execute(last_note_update_query).first()
+        return (row.co_updated, row.co_id) if row else None
     except Exception as e:
         logger.warning(f"MySQL 연결 또는 쿼리 오류: {e}")
-        return pd.DataFrame()
\ No newline at end of file
+        return None
@@ -0,0 +1,70 @@
+import threading
+import numpy as np
+
+
+class SemanticCache:
+    """
+    검색어 임베딩의 코사인 유사도로 이전 검색 결과를 재사용하는 LRU 캐시입니다.
+    같은 key(사용자, 검색 옵션)로 저장된 항목 중 유사도가 threshold 이상인 항목이 있으면 그 결과를 반환합니다.
+    threshold가 1 이상이면 유사도를 비교하지 않고 key가 같은 항목만 반환하므로, key에 검색어를 포함해야 합니다.
+    clear()할 때마다 세대(generation)가 바뀌며, 이전 세대에 시작한 검색의 결과는 put해도 저장하지 않습니다.
+    """
+    def __init__(self, maxsize: int, threshold: float):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.vectors = None  # (N, dim) 정규화된 검색어 임베딩, 오래된 순
+            self.entries = []    # (key, value), vectors와 같은 순서
+
+    def _normalize(self, vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, key, vector):
+        if self.maxsize <= 0:
+            return None
+        vector = self._normalize(vector)
+        with self.lock:
+            if not self.entries:
+                return None
+            mask = np.fromiter((k == key for k, _ in self.entries), dtype=bool, count=len(self.entries))
+            if not mask.any():
+                return None
+            if self.threshold >= 1.0:
+                # 같은 key 중 가장 최근 항목
+                idx = len(mask) - 1 - int(np.argmax(mask[::-1]))
+            else:
+                sims = self.vectors @ vector
+                sims[~mask] = -np.inf
+                idx = int(np.argmax(sims))
+                if sims[idx] < self.threshold:
+                    return None
+            # 최근 사용 항목을 맨 뒤로 이동 (LRU)
+            entry = self.entries.pop(idx)
+            self.entries.append(entry)
+            self.vectors = np.vstack([np.delete(self.vectors, idx, axis=0), self.vectors[idx:idx + 1]])
+            return entry[1]
+
+    def put(self, key, vector, value, generation=None):
+        """
+        generation에는 검색을 시작하기 전에 읽은 self.generation을 전달합니다.
+        그 사이에 clear()되었다면 변경 전 컬렉션의 결과이므로 저장하지 않습니다.
+        """
+        if self.maxsize <= 0:
+            return
+        vector = self._normalize(vector)[np.newaxis, :]
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self.entries.append((key, value))
+            self.vectors = vector if self.vectors is None else np.vstack([self.vectors, vector])
+            if len(self.entries) > self.maxsize:
+                self.entries.pop(0)
+                self.vectors = self.vectors[1:]
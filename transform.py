@@ -0,0 +1,381 @@
+import re
+import json
+import base64
+import functools
+
+import markdownify
+import markdown
+from selectolax.lexbor import LexborHTMLParser
+from fastmcp.utilities.logging import get_logger
+
+from env import TEXT_PREFIX
+from link import get_link_preview
+
+# 모델이나 Chroma를 불러오지 않는 순수 변환 함수만 두어,
+# 파이프라인의 작업 프로세스가 이 모듈만 가볍게 불러와 실행할 수 있도록 합니다.
+logger = get_logger(__name__)
+
+# ---------------------------------------------------------
+# Transform logic: HTML -> Markdown -> Header Split
+# ---------------------------------------------------------
+chunk_size = 500
+chunk_overlap = 100
+unlink_regex_pattern = r'\[(.*?)\]\((.*?)\)'
+unlink_regex = re.compile(unlink_regex_pattern)
+
+header_regex = re.compile(r'^(#{1,6})(?: |$)')
+max_header_level = 6
+# 헤더 메타데이터 키("h1"~"h6")별 마크다운 헤더 기호
+header_marks = {"h" + str(i): "#" * i for i in range(1, max_header_level + 1)}
+
+def find_header_level(md_content: str):
+    """
+    헤더 기준으로 분할했을 때 모든 섹션이 chunk_size 이하가 되는 최소 헤더 레벨을 반환합니다.
+    레벨별로 MarkdownHeaderTextSplitter를 다시 실행하지 않고, 한 번의 스캔으로 그 결과와 같은 섹션 길이를 계산합니다.
+    (코드 블록 내부 헤더와 빈 줄 유지, 헤더 라인 제외, 빈 줄로 나뉜 문단과 같은 헤더 경로의 섹션은 "  \n"으로 연결)
+    조건을 만족하는 레벨이 없으면 최대 레벨을 반환합니다.
+    """
+    # 레벨별로 현재 문단(줄 목록)의 길이, 헤더 경로, 합쳐지는 중인 섹션의 (헤더 경로, 길이)를 추적합니다.
+    paragraph_sizes = [-1] * max_header_level    # "\n".join(줄 목록)의 길이, 줄이 없으면 -1
+    header_stacks = [() for _ in range(max_header_level)]
+    section_headers = [None] * max_header_level
+    section_sizes = [-1] * max_header_level
+    oversized = [False] * max_header_level
+
+    def close_paragraph(i):
+        if paragraph_sizes[i] < 0:
+            return
+        if section_sizes[i] >= 0 and section_headers[i] == header_stacks[i]:
+            section_sizes[i] += 3 + paragraph_sizes[i]
+        else:
+            close_section(i)
+            section_headers[i] = header_stacks[i]
+            section_sizes[i] = paragraph_sizes[i]
+        paragraph_sizes[i] = -1
+
+    def close_section(i):
+        if section_sizes[i] > chunk_size:
+            oversized[i] = True
+        section_sizes[i] = -1
+
+    def append_line(i, size):
+        paragraph_sizes[i] += size + 1
+
+    opening_fence = None
+    for line in md_content.split("\n"):
+        stripped_line = line.strip()
+        if not stripped_line.isprintable():
+            stripped_line = "".join(filter(str.isprintable, stripped_line))
+        if opening_fence is None:
+            if stripped_line.startswith("```") and stripped_line.count("```") == 1:
+                opening_fence = "```"
+            elif stripped_line.startswith("~~~"):
+                opening_fence = "~~~"
+        elif stripped_line.startswith(opening_fence):
+            opening_fence = None
+
+        size = len(stripped_line)
+        if opening_fence is not None:
+            # 코드 블록 안의 줄은 빈 줄도 그대로 문단에 포함됩니다.
+            for i in range(max_header_level):
+                append_line(i, size)
+            continue
+
+        match = header_regex.match(stripped_line)
+        header_level = len(match.group(1)) if match else max_header_level + 1
+        for i in range(max_header_level):
+            if header_level <= i + 1:
+                close_paragraph(i)
+                stack = tuple(h for h in header_stacks[i] if h[0] < header_level)
+                header_stacks[i] = stack + ((header_level, stripped_line[header_level:].strip()),)
+            elif size:
+                append_line(i, size)
+            else:
+                close_paragraph(i)
+
+    for i in range(max_header_level):
+        close_paragraph(i)
+        close_section(i)
+        if not oversized[i]:
+            return i + 1
+    return max_header_level
+
+# selectolax(C 파서)로 직접 변환할 수 있는 태그 목록. 그 외의 태그가 있으면 markdownify로 변환합니다.
+markdown_tags = {
+    "html", "head", "body", "div", "span", "p", "br", "a", "ul", "ol", "li", "pre", "code",
+    "strong", "b", "em", "i", "h1", "h2", "h3", "h4", "h5", "h6", "-text", "-comment",
+}
+# markdownify와 같은 규칙으로 공백을 정리하고, 블록 태그 앞뒤의 공백만 있는 텍스트는 제거합니다.
+newline_whitespace_regex = re.compile(r'[\t \r\n]*[\r\n][\t \r\n]*')
+whitespace_regex = re.compile(r'[\t ]+')
+line_with_content_regex = re.compile(r'^(.*)', flags=re.MULTILINE)
+extract_newlines_regex = re.compile(r'^(\n*)((?:.*[^\n])?)(\n*)$', flags=re.DOTALL)
+backtick_runs_regex = re.compile(r'`+')
+block_tags = {"p", "div", "ul", "ol", "li", "h1", "h2", "h3", "h4", "h5", "h6"}
+heading_tags = {"h1", "h2", "h3", "h4", "h5", "h6"}
+list_bullets = "*+-"
+
+def _is_block(node, with_pre=False):
+    return node is not None and (node.tag in block_tags or (with_pre and node.tag == "pre"))
+
+def _chomp(text):
+    prefix = " " if text and text[0] == " " else ""
+    suffix = " " if text and text[-1] == " " else ""
+    return prefix, suffix, text.strip()
+
+def _render_children(node, parent_tags):
+    # 자식 경계의 줄바꿈은 양쪽 중 많은 쪽(최대 2개)으로 합칩니다.
+    parts = [""]
+    # 번호 목록의 항목 번호는 목록마다 한 번씩 차례로 매깁니다.
+    number = None
+    if node.tag == "ol":
+        start = node.attributes.get("start")
+        number = int(start) if start and start.isdigit() else 1
+    for child in node.iter(include_text=True):
+        if number is not None and child.tag == "li":
+            text = _render_node(child, parent_tags, number)
+            number += 1
+        else:
+            text = _render_node(child, parent_tags)
+        if not text:
+            continue
+        leading, content, trailing = extract_newlines_regex.match(text).groups()
+        if parts[-1] and leading:
+            leading = "\n" * min(2, max(len(parts.pop()), len(leading)))
+        parts.extend([leading, content, trailing])
+    return "".join(parts)
+
+def _render_text(node, parent_tags):
+    text = node.text(deep=True)
+    if "pre" not in parent_tags:
+        text = whitespace_regex.sub(" ", newline_whitespace_regex.sub("\n", text))
+    if "_noformat" not in parent_tags:
+        text = text.replace("*", r"\*").replace("_", r"\_")
+    if _is_block(node.prev, True) or (_is_block(node.parent) and node.prev is None):
+        text = text.lstrip(" \t\r\n")
+    if _is_block(node.next, True) or (_is_block(node.parent) and node.next is None):
+        text = text.rstrip()
+    return text
+
+def _render_list_item(node, parent_tags, number=None):
+    text = _render_children(node, parent_tags).strip()
+    if not text:
+        return "\n"
+    if number is not None:
+        bullet = f"{number}. "
+    else:
+        depth = -1
+        ancestor = node
+        while ancestor is not None:
+            if ancestor.tag == "ul":
+                depth += 1
+            ancestor = ancestor.parent
+        bullet = list_bullets[depth % len(list_bullets)] + " "
+    indent = " " * len(bullet)
+    text = line_with_content_regex.sub(lambda match: indent + match.group(1) if match.group(1) else "", text)
+    return bullet + text[len(bullet):] + "\n"
+
+def _render_node(node, parent_tags=frozenset(), number=None):
+    tag = node.tag
+    if tag == "-text":
+        return _render_text(node, parent_tags)
+    if tag == "-comment":
+        return ""
+    if tag == "br":
+        return " " if "_inline" in parent_tags else "  \n"
+    if tag == "pre":
+        text = node.text(deep=True).strip("\n")
+        return f"\n\n```\n{text}\n```\n\n" if text else ""
+
+    child_tags = parent_tags | {tag}
+    if tag in ("pre", "code"):
+        child_tags |= {"_noformat"}
+    if tag in heading_tags:
+        child_tags |= {"_inline"}
+    if tag == "li":
+        return _render_list_item(node, child_tags, number)
+    text = _render_children(node, child_tags)
+
+    if tag in ("ul", "ol"):
+        if node.parent is not None and node.parent.tag == "li":
+            return "\n" + text.rstrip()
+        sibling = node.next
+        while sibling is not None and sibling.tag in ("-text", "-comment") and not sibling.text(deep=True).strip():
+            sibling = sibling.next
+        before_paragraph = sibling is not None and sibling.tag not in ("ul", "ol")
+        return "\n\n" + text + ("\n" if before_paragraph else "")
+    if tag in heading_tags:
+        if "_inline" in parent_tags:
+            return text
+        text = whitespace_regex.sub(" ", text.strip().replace("\n", " "))
+        return f"\n\n{'#' * int(tag[1])} {text}\n\n"
+    if tag in ("p", "div"):
+        if "_inline" in parent_tags:
+            return " " + text.strip(" \t\r\n") + " "
+        text = text.strip(" \t\r\n")
+        return f"\n\n{text}\n\n" if text else ""
+    if tag == "code":
+        if "_noformat" in parent_tags:
+            return text
+        prefix, suffix, text = _chomp(text)
+        if not text:
+            return ""
+        max_backticks = max((len(run) for run in backtick_runs_regex.findall(text)), default=0)
+        delimiter = "`" * (max_backticks + 1)
+        if max_backticks > 0:
+            text = f" {text} "
+        return f"{prefix}{delimiter}{text}{delimiter}{suffix}"
+    if tag in ("a", "strong", "b", "em", "i"):
+        prefix, suffix, text = _chomp(text)
+        if not text:
+            return ""
+        if tag == "a":
+            href = node.attributes.get("href")
+            if not href:
+                return f"{prefix}{text}{suffix}"
+            if text.replace(r"\_", "_") == href:
+                return f"<{href}>"
+            return f"{prefix}[{text}]({href}){suffix}"
+        mark = "**" if tag in ("strong", "b") else "*"
+        return f"{prefix}{mark}{text}{mark}{suffix}"
+    return text
+
+def _html_to_markdown(html: str):
+    """
+    selectolax로 HTML을 파싱하여 markdownify(heading_style="atx")와 같은 형식의 마크다운으로 변환합니다.
+    지원하지 않는 태그가 있으면 ValueError를 발생시킵니다.
+    """
+    body = LexborHTMLParser(html).body
+    if body is None:
+        return ""
+    for node in body.traverse(include_text=False):
+        if node.tag not in markdown_tags:
+            raise ValueError(f"Unsupported tag: {node.tag}")
+    return _render_children(body, frozenset()).strip("\n")
+
+def to_markdown(html: str):
+    if html:
+        try:
+            return _html_to_markdown(html)
+        except Exception:
+            pass
+    return markdownify.markdownify(html or "", heading_style="atx")
+
+def to_html(md: str):
+    return markdown.markdown(md)
+
+# 같은 본문이 반복해서 변환되는 조회/저장 경로(스냅샷 목록 등)를 위한 캐시 버전
+@functools.lru_cache(maxsize=512)
+def to_markdown_cached(html: str):
+    return to_markdown(html)
+
+@functools.lru_cache(maxsize=512)
+def to_html_cached(md: str):
+    return to_html(md)
+
+def process_content(original_id, user_id, title, html_content, created_at, external_link=None):
+    """
+    HTML 내용을 마크다운으로 변환하고 헤더 기반으로 청킹하여 Document 리스트를 반환합니다.
+    """    
+    # [Step A] HTML -> Markdown 변환
+    # heading_style="atx"는 # 기호를 사용하도록 강제합니다 (필수)
+    # 링크 제거 정규식도 적용
+    # 내용이 없으면 청크도 없고, 태그가 없는 일반 텍스트는 변환 없이 그대로 사용합니다.
+    if not html_content:
+        return []
+    md_content_pre = to_markdown(html_content) if '<' in html_content else html_content
+    found_links = unlink_regex.findall(md_content_pre)
+    
+    # 메타데이터용 리스트 생성
+    links_meta_dict1 = {link_url: base64.b64encode(str(i).encode()).decode() for i, (_, link_url) in enumerate(found_links)}
+    links_meta_dict2 = {base64.b64encode(str(i).encode()).decode(): link_url for i, (_, link_url) in enumerate(found_links)}
+
+    def replacer(match):
+        link_name = match.group(1)  # 첫 번째 그룹: 링크 이름
+        url = match.group(2)      # 두 번째 그룹: URL (여기서는 사용 안 함)
+        return f"[{link_name}]({links_meta_dict1[url]})"
+
+    # 3. 임베딩용 텍스트 정제 (기존 요구사항: URL 제거하고 텍스트만 남기거나 []()형태로)
+    # 여기서는 [텍스트]() 형태로 변경합니다.
+    md_content = unlink_regex.sub(replacer, md_content_pre)
+
+    # [Step B] 1차 청킹: 헤더(Header) 기준 분리
+    # 문서를 논리적 섹션(챕터)으로 나눕니다.
+    # 분할 레벨은 문서를 한 번만 스캔하여 결정하고, 분할은 한 번만 수행합니다.
+    max_level = find_header_level(md_content)
+    from langchain_text_splitters import MarkdownHeaderTextSplitter, RecursiveCharacterTextSplitter
+    headers_to_split_on = [
+        ("#" * i, "h" + str(i))
+    for i in range(1, max_level + 1)]
+    markdown_splitter = MarkdownHeaderTextSplitter(headers_to_split_on=headers_to_split_on)
+    md_header_splits = markdown_splitter.split_text(md_content)
+
+    # [Step C] 2차 청킹: 문자 수 기준 분리
+    # 헤더로 나눴어도 특정 챕터의 내용이 클 수 있으므로 안전장치로 다시 자릅니다.
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        separators=["\n\n", "\n"]
+    )
+    
+    # Document 객체 리스트를 받아 다시 쪼갭니다.
+    final_splits = text_splitter.split_documents(md_header_splits)
+
+    processed_data = []
+    
+    for idx, split in enumerate(final_splits):
+        # 헤더 정보가 메타데이터에 포함되어 있음 (예: {'#': '소개', '##': '배경'})
+        header_metadata = split.metadata 
+        
+        # 검색 품질을 위해 텍스트 앞에 상위 헤더 문맥을 붙여줄 수도 있음 (선택사항)
+        # 여기서는 원본 텍스트 그대로 사용
+        raw_chunk_text = split.page_content
+        if (len(raw_chunk_text) < 2):
+            continue  # 너무 짧은 청크는 무시
+        if external_link:
+            links_meta_list = [external_link]
+            chunk_text = raw_chunk_text
+        else:
+            # 현재 청크 내의 모든 링크 추출 (텍스트, URL)
+            found_links = unlink_regex.findall(raw_chunk_text)
+            
+            # 메타데이터용 리스트 생성 (JSON 저장을 위해 dict 리스트로)
+            # 예: [{"text": "구글", "url": "https://google.com"}, ...]
+            links_meta_list = [{"origin": title, "text": link_text, "url": links_meta_dict2[link_index]} for link_text, link_index in found_links]
+            
+            # 3. 임베딩용 텍스트 정제 (기존 요구사항: URL 제거하고 텍스트만 남기거나 []()형태로)
+            # 여기서는 [텍스트]() 형태로 변경합니다.
+            chunk_text = unlink_regex.sub(r'[\1]()', raw_chunk_text)
+
+
+        # 헤더 경로 문자열 생성
+        _id = f"{original_id}_{idx}"
+        header_path = "\n".join(f"{header_marks[k]} {v}" for k, v in header_metadata.items()) if header_metadata else ""
+        prefix = f"# {title}\n{header_path}\n"
+        text = f"{TEXT_PREFIX}{prefix}{chunk_text}"  # 임베딩될 텍스트
+        logger.debug("================================")
+        logger.debug(text)
+        processed_data.append({
+            "id": _id, # 유니크 ID 생성
+            "text": text,
+            "metadata": {
+                "original_id": original_id,
+                "user_id": user_id,
+                "title": title,
+                "prefix": f"{TEXT_PREFIX}{prefix}",
+                "created_at": str(created_at),
+                "with_external": external_link is not None,
+                "links": json.dumps(links_meta_list, ensure_ascii=False),
+                **header_metadata # 헤더 정보도 메타데이터로 저장
+            }
+        })
+
+        # 첨부 링크 청크 생성
+        if external_link is not None:
+            continue
+        for idx2, link in enumerate(links_meta_list):
+            if idx2 == 0:
+                logger.info(f"{title}[{idx}](links: {len(links_meta_list)}")
+            preview = get_link_preview(link["url"])
+            processed_data += process_content(f"{_id}_{idx2}", user_id, preview.get("title"), preview.get("description"), created_at, link)
+    return processed_data